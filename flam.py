@@ -23,8 +23,11 @@ import logging
 import logging.handlers
 import subprocess
 import sys
+import tempfile
 import threading
 import weakref
+from bisect import bisect_left
+from collections import deque
 from Queue import Queue
 
 
@@ -69,6 +72,8 @@ class LoggingError(Error):
 def _check_list_option(option, opt, value):
     if isinstance(value, list):
         return value
+    if ',' not in value:
+        return [value.strip()]
     return [i.strip() for i in value.split(',')]
 
 
@@ -115,13 +120,25 @@ class FlagParser(optparse.OptionParser):
     def __init__(self, *args, **kwargs):
         kwargs.setdefault('conflict_handler', 'resolve')
         kwargs.setdefault('option_class', FlagOption)
+        # (key, text) of the last format_help() call, reset whenever options,
+        # defaults or commands change.
+        self._help_cache = None
+        # Function whose docstring is used as usage once it is first needed.
+        self._usage_function = None
         optparse.OptionParser.__init__(self, *args, **kwargs)
         self.set_usage('%prog [<flags>] <command> ...')
         self.add_option('--flags', metavar='FILE', type='filename',
                         action='callback', help='load flags from FILE',
                         callback=self._flag_loader, default=None)
         self._commands = {}
-        self._hidden_commands = []
+        self._command_trie = {}
+        # Argument spec of each command, keyed by function.
+        self._command_specs = {}
+        # Rendered help entry of each command, keyed by command tokens.
+        self._command_help = {}
+        # Output of format_commands(), reset when a command is registered.
+        self._formatted_commands = None
+        self._hidden_commands = set()
 
     def set_epilog(self, epilog):
         """Set help epilog text."""
@@ -131,9 +148,20 @@ class FlagParser(optparse.OptionParser):
         if 'help' in kwargs and kwargs.get('default') != None \
                 and '%default' not in kwargs['help']:
             kwargs['help'] += ' [%default]'
-        option = optparse.OptionParser.add_option(self, *args, **kwargs)
-        self.option_list.sort(key=lambda o: o.dest)
-        return option
+        self._help_cache = None
+        return optparse.OptionParser.add_option(self, *args, **kwargs)
+
+    def remove_option(self, opt_str):
+        self._help_cache = None
+        optparse.OptionParser.remove_option(self, opt_str)
+
+    def set_default(self, dest, value):
+        self._help_cache = None
+        optparse.OptionParser.set_default(self, dest, value)
+
+    def set_defaults(self, **kwargs):
+        self._help_cache = None
+        optparse.OptionParser.set_defaults(self, **kwargs)
 
     def set_version(self, version):
         """Set the application version.
@@ -153,59 +181,72 @@ class FlagParser(optparse.OptionParser):
     def hide_command(self, function):
         """Hide a command from the help output."""
         commands = tuple(function.__name__.split('_'))
-        self._hidden_commands.append(commands)
+        self._hidden_commands.add(commands)
         return self.register_command(function)
 
     def register_command(self, function):
         """Register a command."""
         commands = tuple(function.__name__.split('_'))
         self._commands[commands] = function
+        argspec = inspect.getargspec(function)
+        self._command_specs[function] = argspec
+        self._command_help[commands] = self._format_command_help(
+            commands, argspec, inspect.getdoc(function))
+        self._formatted_commands = None
+        self._help_cache = None
+        node = self._command_trie
+        for token in commands:
+            node = node.setdefault(token, {})
+        node[None] = function
         return function
 
+    def set_usage(self, usage):
+        self._usage_function = None
+        optparse.OptionParser.set_usage(self, usage)
+
+    def set_usage_from(self, function):
+        """Use the docstring of function as the usage string.
+
+        The docstring is only read when usage is first displayed.
+        """
+        self._usage_function = function
+
+    def get_usage(self):
+        self._resolve_usage()
+        return optparse.OptionParser.get_usage(self)
+
     def format_help(self, formatter=None):
+        self._resolve_usage()
         if formatter is None:
             formatter = self.formatter
-        result = []
-        if self.usage:
-            result.append(self.get_usage() + '\n')
-        if self.description:
-            result.append(self.format_description(formatter) + '\n')
-        if len(self._commands) > 1:
-            result.append(self.format_commands(formatter))
-        result.append(self.format_option_help(formatter))
-        result.append(self.format_epilog(formatter))
-        return ''.join(result)
+        # Options added to groups can't be tracked, so don't cache then.
+        key = (formatter, self.usage, self.description, self.epilog,
+               self.get_prog_name())
+        if self.option_groups or self._help_cache is None \
+                or self._help_cache[0] != key:
+            self._help_cache = (key, self._format_help(formatter))
+        return self._help_cache[1]
+
+    def format_option_help(self, formatter=None):
+        # Options are only sorted for display, not every time one is added.
+        option_list = self.option_list
+        self.option_list = sorted(option_list, key=lambda o: o.dest)
+        try:
+            return optparse.OptionParser.format_option_help(self, formatter)
+        finally:
+            self.option_list = option_list
 
     def format_commands(self, formatter=None):
         """Format commands for help."""
-        result = []
-        result.append('Commands:')
-        for command_args, command in sorted(self._commands.iteritems()):
-            if command_args in self._hidden_commands:
-                continue
-            help = inspect.getdoc(command)
-            argspec = inspect.getargspec(command)
-            defaults_len = len(argspec.defaults or [])
-            args = ['<%s>' % arg for arg in argspec.args]
-            if defaults_len:
-                arg_spec = ' '.join(args[:-defaults_len])
-                optional_spec = args[-defaults_len:]
-            else:
-                arg_spec = ' '.join(args)
-                optional_spec = []
-            if argspec.varargs:
-                optional_spec.extend(['<' + argspec.varargs + '>', '...'])
-            optional_spec = ' '.join(optional_spec)
-            if optional_spec:
-                optional_spec = '[' + optional_spec.strip() + ']'
-            command_args_help = ' '.join(command_args)
-            result.append(' '.join(filter(None, [command_args_help, arg_spec,
-                                                 optional_spec])))
-            if help:
-                result.extend('    ' + line for line in help.splitlines())
+        if self._formatted_commands is None:
+            result = ['Commands:']
+            command_help = self._command_help
+            result.extend(command_help[command_args]
+                          for command_args in sorted(command_help)
+                          if command_args not in self._hidden_commands)
             result.append('')
-        result.append('')
-        return '\n'.join(result)
+            self._formatted_commands = '\n'.join(result)
+        return self._formatted_commands
 
     def dispatch_command(self, args):
         """Dispatch to command functions registered with @command.
@@ -220,50 +261,39 @@ class FlagParser(optparse.OptionParser):
         if not args:
             raise CommandError('command not provided, try "help"')
 
-        # Find longest matching command
+        # Find longest matching command by walking the command trie.
         matched_command = None
         longest_match = 0
-        for command_args, command in sorted(self._commands.iteritems()):
-            command_length = len(command_args)
-            if args[:command_length] == list(command_args) and \
-                    command_length > longest_match:
-                matched_command = command
-                longest_match = command_length
+        node = self._command_trie
+        for depth, token in enumerate(args):
+            node = node.get(token)
+            if node is None:
+                break
+            if None in node:
+                matched_command = node[None]
+                longest_match = depth + 1
 
         if not matched_command:
             raise CommandError('no command found matching %r, try "help"'
                                % ' '.join(map(str, args)))
 
-        # Attempt to move arguments into command_args and command_kwargs from
-        # args.
-        command_description = ' '.join(map(str, args[:longest_match]))
-        args = args[longest_match:]
-        command_args = []
-
-        argspec = inspect.getargspec(matched_command)
+        argspec = self._command_specs[matched_command]
 
         if argspec.keywords:
             raise ValueError('keyword wildcards are not supported')
 
-        # Move positional arguments required by function spec
-        if argspec.args:
-            func_arg_length = len(argspec.args)
-            if len(args) + len(argspec.defaults or []) < func_arg_length:
-                raise CommandError('insufficient arguments to %r, try "help"'
-                                % command_description)
-            command_args.extend(args[:func_arg_length])
-            args = args[func_arg_length:]
-
-        if argspec.varargs:
-            command_args.extend(args)
-            args = []
-
-        if args:
+        # Check the remaining arguments fit the function spec, then pass them
+        # straight through.
+        available = len(args) - longest_match
+        if available < len(argspec.args) - len(argspec.defaults or []):
+            raise CommandError('insufficient arguments to %r, try "help"'
+                               % ' '.join(map(str, args[:longest_match])))
+        if available > len(argspec.args) and not argspec.varargs:
             raise CommandError(
                 'too many arguments provided to %r, try "help"' %
-                command_description)
+                ' '.join(map(str, args[:longest_match])))
 
-        matched_command(*command_args)
+        matched_command(*args[longest_match:])
         return True
 
     def parse_flags_from_file(self, filename, values=None):
@@ -278,45 +308,96 @@ class FlagParser(optparse.OptionParser):
         return self.parse_args(args, values=values)
 
     # Internal methods
+    def _resolve_usage(self):
+        function = self._usage_function
+        if function is not None:
+            usage = inspect.getdoc(function)
+            self._usage_function = None
+            if usage:
+                self.set_usage(usage)
+
+    def _format_help(self, formatter):
+        result = []
+        if self.usage:
+            result.append(self.get_usage() + '\n')
+        if self.description:
+            result.append(self.format_description(formatter) + '\n')
+        if len(self._commands) > 1:
+            result.append(self.format_commands(formatter))
+        result.append(self.format_option_help(formatter))
+        result.append(self.format_epilog(formatter))
+        return ''.join(result)
+
+    def _format_command_help(self, command_args, argspec, help):
+        defaults_len = len(argspec.defaults or [])
+        args = ['<%s>' % arg for arg in argspec.args]
+        if defaults_len:
+            arg_spec = ' '.join(args[:-defaults_len])
+            optional_spec = args[-defaults_len:]
+        else:
+            arg_spec = ' '.join(args)
+            optional_spec = []
+        if argspec.varargs:
+            optional_spec.extend(['<' + argspec.varargs + '>', '...'])
+        optional_spec = ' '.join(optional_spec)
+        if optional_spec:
+            optional_spec = '[' + optional_spec.strip() + ']'
+        usage = ' '.join(command_args)
+        if arg_spec:
+            usage += ' ' + arg_spec
+        if optional_spec:
+            usage += ' ' + optional_spec
+        result = [usage]
+        if help:
+            result.extend('    ' + line for line in help.splitlines())
+        result.append('')
+        return '\n'.join(result)
+
     def _flag_loader(self, option, opt_str, value, parser):
-        args = self._load_flags(value)
-        for arg in args:
-            parser.rargs.insert(0, arg)
+        parser.rargs[:0] = self._load_flags(value)
 
     def _load_flags(self, file):
         if isinstance(file, basestring):
-            file = open(file)
-            close = True
-        else:
-            close = False
-        section = None
-        args = {}
-        try:
-            for line in file:
-                line = line.strip()
-                if not line or line.startswith('#'):
+            # Flag files are small, so read them with a single call.
+            fd = open(file)
+            try:
+                file = fd.read().splitlines()
+            finally:
+                fd.close()
+        prog = self.get_prog_name()
+        # Whether lines in the current section apply to this program.
+        active = True
+        args = []
+        # Index of each key's argument in args; later entries win.
+        positions = {}
+        for line in file:
+            line = line.strip()
+            if not line or line[0] == '#':
+                continue
+            if line[0] == '[':
+                section = line[1:-1]
+                active = not section or section == prog
+            elif active:
+                key, sep, value = line.partition('=')
+                if not sep:
+                    raise optparse.OptionValueError(
+                        'invalid configuration entry %r' % line)
+                key = key.strip()
+                value = value.strip()
+                if value == 'true':
+                    arg = '--' + key
+                # FIXME(alec) optparse does not support "negation" of
+                # boolean flags...I'm not sure what the solution is here.
+                elif value != 'false':
+                    arg = '--' + key + '=' + value
+                else:
                     continue
-                if line.startswith('['):
-                    section = line[1:-1]
-                elif not section or section == self.get_prog_name():
-                    key, sep, value = line.partition('=')
-                    if not sep:
-                        raise optparse.OptionValueError(
-                            'invalid configuration entry %r' % line)
-                    key = key.strip()
-                    value = value.strip()
-                    if value.strip() == 'true':
-                        args[key] = None
-                    # FIXME(alec) optparse does not support "negation" of
-                    # boolean flags...I'm not sure what the solution is here.
-                    elif value.strip() != 'false':
-                        args[key] = value
-            args = ['--%s%s' % (k, '' if v is None else '=' + v)
-                    for k, v in args.items()]
-            return args
-        finally:
-            if close:
-                file.close()
+                if key in positions:
+                    args[positions[key]] = arg
+                else:
+                    positions[key] = len(args)
+                    args.append(arg)
+        return args
 
 
 class Flag(object):
@@ -326,39 +407,54 @@ class Flag(object):
     Refer to optparse documentation for details.
     """
 
+    __slots__ = ('_option', '_dest', '_default', '_required')
+
     def __init__(self, *args, **kwargs):
         """Define a new flag property.
 
         :param args: Positional arguments to pass to :func:`define_flag`.
         :param kwargs: Keyword arguments to pass to :func:`define_flag`.
         """
-        self._option = define_flag(*args, **kwargs)
+        self._option = option = define_flag(*args, **kwargs)
+        # Copied out of the option, as they are read on every access.
+        self._dest = option.dest
+        # ValuesProxy falls back to parser defaults itself; this is only used
+        # when flags is a plain optparse.Values.
+        self._default = option.default
+        self._required = option.required
 
     def __get__(self, instance, owner):
-        value = getattr(flags.values, self._option.dest, self._option.default)
-        if self._option.required and (value is optparse.NO_DEFAULT
-                                      or value is None):
+        value = getattr(flags, self._dest, self._default)
+        if self._required and (value is optparse.NO_DEFAULT
+                               or value is None):
             raise optparse.OptionValueError('required flag --%s not defined'
-                                            % self._option.dest)
+                                            % self._dest)
         return value
 
 
-class ValuesProxy(object):
+class ValuesProxy(optparse.Values, object):
     """Acts like optparse.Values but uses defaults defined in OptionParser.
 
-    :attr values: The real optparse.Values object.
+    Parsed values live in the instance dict, so reading them is a plain
+    attribute lookup; only flags that have not been set fall back to the
+    parser defaults.
+
+    :attr values: The proxy itself, for code expecting an optparse.Values.
     """
 
+    __slots__ = ('_parser', '__dict__')
+
     def __init__(self, parser):
-        object.__setattr__(self, '_parser', parser)
-        object.__setattr__(self, 'values', optparse.Values())
+        optparse.Values.__init__(self)
+        self._parser = parser
 
-    def __setattr__(self, name, value):
-        setattr(self.values, name, value)
+    @property
+    def values(self):
+        return self
 
     def __getattr__(self, name):
-        option = self._parser.get_option('--' + name)
-        return getattr(self.values, name, option and option.default)
+        # OptionParser.defaults maps each option dest to its default.
+        return self._parser.defaults.get(name)
 
 
 class ThreadPool(object):
@@ -369,23 +465,39 @@ class ThreadPool(object):
 
         :param threads: Number of threads to start in the thread pool.
         """
-        self._queue = Queue()
+        self._jobs = deque()
+        self._condition = threading.Condition()
+        self._quitting = False
         self._pool = [threading.Thread(target=self._worker)
                       for _ in range(threads)]
+        for thread in self._pool:
+            thread.daemon = True
+            thread.start()
 
     def _worker(self):
         """Waits for and executes jobs from the queue."""
+        jobs = self._jobs
         while True:
-            message = self._queue.get()
-            if message is None:
-                self._queue.task_done()
-                return
-            job, args, kwargs = message
+            self._condition.acquire()
             try:
-                job(*args, **kwargs)
-            except Exception, e:
-                log.error('thread pool worker failed', exc_info=e)
-            self._queue.task_done()
+                while not jobs and not self._quitting:
+                    self._condition.wait()
+                if not jobs:
+                    return
+                # Take a fair share of the backlog in one go, leaving the
+                # rest for the other workers.
+                batch = [jobs.popleft() for _ in
+                         xrange(max(1, len(jobs) // len(self._pool)))]
+            finally:
+                self._condition.release()
+            for job, args, kwargs in batch:
+                try:
+                    if kwargs is None:
+                        job(*args)
+                    else:
+                        job(*args, **kwargs)
+                except Exception, e:
+                    log.error('thread pool worker failed', exc_info=e)
 
     def add(self, function, *args, **kwargs):
         """Add a job to the thread pool.
@@ -394,16 +506,26 @@ class ThreadPool(object):
         :param args: Positional arguments to pass to function.
         :param kwargs: Keyword arguments to pass to function.
         """
-        self._queue.put((function, args, kwargs))
+        self._condition.acquire()
+        try:
+            self._jobs.append((function, args, kwargs or None))
+            self._condition.notify()
+        finally:
+            self._condition.release()
 
     def quit(self):
-        """Signal all workers to quit and block until they have."""
-        self._queue.clear()
-        for _ in range(len(self._pool)):
-            self._queue.put(None)
-        self._queue.join()
+        """Signal all workers to quit and block until they have.
+
+        Jobs already queued are run before the workers exit.
+        """
+        self._condition.acquire()
+        try:
+            self._quitting = True
+            self._condition.notify_all()
+        finally:
+            self._condition.release()
         for thread in self._pool:
-            thread.wait()
+            thread.join()
 
 
 class WeakList(list):
@@ -425,6 +547,14 @@ class WeakList(list):
     >>> things
     [{1: 2}, [1, 2]]
 
+    Values can be removed explicitly:
+
+    >>> c = mylist([3])
+    >>> things.append(c)
+    >>> things.remove(c)
+    >>> things
+    [{1: 2}, [1, 2]]
+
     Then delete the original references, dropping the weak references:
 
     >>> del a
@@ -435,37 +565,147 @@ class WeakList(list):
     []
     """
 
+    __slots__ = ('_entries', '_keys', '_references', '__weakref__')
+
+    def __init__(self, sequence=()):
+        list.__init__(self)
+        # Sort key of each reference and the id() of its referent, keyed by
+        # id() of the reference.
+        self._entries = {}
+        # Sort keys in list order. Keys always increase along the list, so a
+        # reference is found by bisecting for its key. Inherited list methods
+        # (pop(), del, reverse() etc.) don't maintain them, so every hit is
+        # checked and a miss rebuilds them from the list with _sync().
+        self._keys = []
+        # References to each live value, keyed by id() of the value.
+        self._references = {}
+        self.extend(sequence)
+
     def append(self, value):
-        ref = weakref.proxy(value, self._clear_reference)
-        super(WeakList, self).append(ref)
+        if len(self._keys) != len(self):
+            self._sync()
+        keys = self._keys
+        self._add(len(self), keys[-1] + 1.0 if keys else 0.0, value)
 
     def insert(self, index, value):
-        ref = weakref.proxy(value, self._clear_reference)
-        super(WeakList, self).insert(index, ref)
+        length = len(self)
+        if index < 0:
+            index = max(length + index, 0)
+        if index >= length:
+            return self.append(value)
+        if len(self._keys) != length:
+            self._sync()
+        keys = self._keys
+        if index == 0:
+            key = keys[0] - 1.0
+        else:
+            key = (keys[index - 1] + keys[index]) / 2
+            if not keys[index - 1] < key < keys[index]:
+                # Out of precision between these neighbours.
+                self._sync()
+                key = index - 0.5
+        self._add(index, key, value)
 
     def extend(self, sequence):
         for value in sequence:
             self.append(value)
 
     def remove(self, value):
-        for entry in self:
-            if value is entry:
-                return list.remove(self, entry)
+        index = self._index_of(value)
+        if index is None:
+            raise ValueError('WeakList.remove(x): x not in list')
+        self._delete(index)
+
+    def _add(self, index, key, value):
+        ref = weakref.proxy(value, self._clear_reference)
+        self._entries[id(ref)] = (key, id(value))
+        self._references.setdefault(id(value), []).append(ref)
+        self._keys.insert(index, key)
+        super(WeakList, self).insert(index, ref)
+
+    def _sync(self):
+        """Rebuild the bookkeeping from the references in the list."""
+        entries = self._entries
+        self._entries = {}
+        self._references = {}
+        self._keys = map(float, xrange(len(self)))
+        for key, ref in zip(self._keys, self):
+            if type(ref) not in weakref.ProxyTypes:
+                continue
+            entry = entries.get(id(ref))
+            if entry is not None:
+                self._entries[id(ref)] = (key, entry[1])
+                self._references.setdefault(entry[1], []).append(ref)
+
+    def _index(self, ref):
+        """Return the index of a tracked reference, or None."""
+        entry = self._entries.get(id(ref))
+        if entry is None:
+            return None
+        keys = self._keys
+        if len(keys) == len(self):
+            i = bisect_left(keys, entry[0])
+            if i < len(self) and self[i] is ref:
+                return i
+        self._sync()
+        entry = self._entries.get(id(ref))
+        return None if entry is None else int(entry[0])
+
+    def _index_of(self, value):
+        """Return the index of the first reference to value, or of value
+        itself, or None."""
+        for attempt in xrange(2):
+            references = self._references.get(id(value))
+            if not references:
+                break
+            entries = self._entries
+            index = self._index(min(references,
+                                    key=lambda r: entries[id(r)][0]))
+            if index is not None:
+                return index
+            # The reference had left the list, and _index() has rebuilt the
+            # bookkeeping without it, so look again.
+        # value may be one of the proxies held by the list itself.
+        index = self._index(value)
+        if index is not None:
+            return index
+        self._sync()
+        for i, entry in enumerate(self):
+            if entry is value:
+                return i
+        return None
+
+    def _delete(self, index):
+        ref = self[index]
+        entry = self._entries.pop(id(ref), None)
+        if entry is not None:
+            references = self._references[entry[1]]
+            for i, other in enumerate(references):
+                if other is ref:
+                    del references[i]
+                    break
+            if not references:
+                del self._references[entry[1]]
+        del self._keys[index]
+        del self[index]
 
     def _clear_reference(self, ref):
-        for i, value in enumerate(self):
-            if value is ref:
-                del self[i]
-                return
-        raise ValueError('could not find weakref %r to remove' % ref)
+        # References that were already taken out of the list (by remove(),
+        # pop(), del etc.) can still be called back; there is nothing to do.
+        index = self._index(ref)
+        if index is not None:
+            self._delete(index)
 
     def __repr__(self):
-        return '[%s]' % ', '.join(str(i) for i in self)
+        return '[%s]' % ', '.join(map(str, self))
 
 
 class Log(object):
     """A class property that returns a Logger object scoped to the owning
     class."""
+
+    __slots__ = ('_name',)
+
     def __init__(self, name=None):
         self._name = name
 
@@ -485,7 +725,8 @@ class cached_property(object):
         if instance is None:
             return self
         value = self.function(instance)
-        setattr(instance, self.__name__, value)
+        # Bypass __setattr__; later reads are served from the instance dict.
+        instance.__dict__[self.__name__] = value
         return value
 
 
@@ -546,7 +787,11 @@ def _init(args=None, usage=None, version=None, epilog=None, config=None):
     flags.values._update_loose(vars(flag_parser.get_default_values()))
     if config and os.path.exists(config):
         flag_parser.parse_flags_from_file(config, values=flags.values)
-    _, args = flag_parser.parse_args(args, values=flags.values)
+    args = sys.argv[1:] if args is None else list(args)
+    # Defaults are already loaded, so there is nothing for optparse to do
+    # when no flags were passed.
+    if any(arg.startswith('-') for arg in args):
+        _, args = flag_parser.parse_args(args, values=flags.values)
     return args
 
 
@@ -576,8 +821,8 @@ def run(main=None, args=None, usage=None, version=None, epilog=None,
     :raises Error: If main is not provided and no commands are defined with
                    :func:`command`.
     """
-    if usage is None:
-        usage = inspect.getdoc(main)
+    if usage is None and main is not None:
+        flag_parser.set_usage_from(main)
     args = _init(args=args, usage=usage, version=version, epilog=epilog,
                  config=config)
     if init:
@@ -599,17 +844,28 @@ def fatal(*args):
     sys.exit(1)
 
 
-def execute(command, **kwargs):
+def execute(command, spool=False, **kwargs):
     """Execute a command.
 
     :param command: Command to execute, as a list of args.
+    :param spool: If True, the command writes its output directly to
+                  temporary files, which are returned in place of strings.
+                  Use this for commands with large output.
     :param kwargs: Extra keyword args to pass to subprocess.Popen.
     :returns: Tuple of (returncode, stdout, stderr)
     """
     kwargs.setdefault('close_fds', True)
-    process = subprocess.Popen(command, stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE)
-    stdout, stderr = process.communicate()
+    if spool:
+        stdout, stderr = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+        process = subprocess.Popen(command, stdout=stdout, stderr=stderr,
+                                   **kwargs)
+        process.wait()
+        stdout.seek(0)
+        stderr.seek(0)
+    else:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, **kwargs)
+        stdout, stderr = process.communicate()
     return process.returncode, stdout, stderr
 
 
@@ -628,6 +884,59 @@ class NullHandler(logging.Handler):
         pass
 
 
+class BackgroundHandler(logging.Handler):
+    """Passes records to another handler from a background thread.
+
+    Logging calls only queue the record, so slow handlers (syslog, files) do
+    not block the calling thread.
+    """
+
+    def __init__(self, handler):
+        """Wrap :ref:`handler`.
+
+        :param handler: Handler that emits the queued records.
+        """
+        logging.Handler.__init__(self, handler.level)
+        self.handler = handler
+        self._exception_formatter = logging.Formatter()
+        self._queue = Queue()
+        self._thread = threading.Thread(target=self._emitter)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def emit(self, record):
+        # Render the message and traceback now, while the objects they refer
+        # to are still in the state being logged. Other handlers share the
+        # record, so work on a copy.
+        try:
+            queued = logging.makeLogRecord(record.__dict__)
+            queued.msg = record.getMessage()
+            queued.args = None
+            if record.exc_info:
+                queued.exc_text = self._exception_formatter.formatException(
+                    record.exc_info)
+                queued.exc_info = None
+            self._queue.put(queued)
+        except (KeyboardInterrupt, SystemExit):
+            raise
+        except:
+            self.handleError(record)
+
+    def close(self):
+        """Emit any queued records, then close the wrapped handler."""
+        self._queue.put(None)
+        self._thread.join()
+        self.handler.close()
+        logging.Handler.close(self)
+
+    def _emitter(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            self.handler.handle(record)
+
+
 class LogManager(object):
     """Convenience class for managing loggers.
 
@@ -638,11 +947,15 @@ class LogManager(object):
     TIME_FORMAT = '%Y%m%d %H%M%S'
 
     def __init__(self):
-        self.formatter = logging.Formatter(self.FORMAT, self.TIME_FORMAT)
         self.root = logging.getLogger()
         self.root.setLevel(DEFAULT_LOG_LEVEL)
         self.root.addHandler(NullHandler())
 
+    @cached_property
+    def formatter(self):
+        """Formatter shared by handlers, created when the first is added."""
+        return logging.Formatter(self.FORMAT, self.TIME_FORMAT)
+
     def get_logger(self, name):
         return logging.getLogger(name)
 
@@ -650,23 +963,32 @@ class LogManager(object):
         self.root.setLevel(level)
 
     def log_to_console(self, level=FINEST):
-        handler = logging.StreamHandler()
-        handler.setLevel(level)
-        handler.setFormatter(self.formatter)
-        self.root.addHandler(handler)
+        self._add_handler(logging.StreamHandler(), level)
 
-    def log_to_syslog(self, address, facility='local4', level=FINEST):
-        handler = logging.handlers.SysLogHandler(address, facility)
-        handler.setLevel(level)
-        handler.setFormatter(self.formatter)
-        self.root.addHandler(handler)
+    def log_to_syslog(self, address, facility='local4', level=FINEST,
+                      background=False):
+        """Log to syslog.
+
+        :param background: Send records from a background thread.
+        """
+        self._add_handler(logging.handlers.SysLogHandler(address, facility),
+                          level, background)
 
     def log_to_file(self, filename, max_bytes=1024 * 1024 * 10,
-                    backup_count=10, level=FINEST):
+                    backup_count=10, level=FINEST, background=False):
+        """Log to a rotating log file.
+
+        :param background: Write records from a background thread.
+        """
         handler = logging.handlers.RotatingFileHandler(
             filename, maxBytes=max_bytes, backupCount=backup_count)
+        self._add_handler(handler, level, background)
+
+    def _add_handler(self, handler, level, background=False):
         handler.setLevel(level)
         handler.setFormatter(self.formatter)
+        if background:
+            handler = BackgroundHandler(handler)
         self.root.addHandler(handler)
 
 
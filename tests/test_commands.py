@@ -0,0 +1,91 @@
+# encoding: utf-8
+#
+# Copyright (C) 2009 Alec Thomas <alec@swapoff.org>
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+# Author: Alec Thomas <alec@swapoff.org>
+
+from nose.tools import assert_equal, assert_raises, assert_true
+
+import flam
+
+
+def _parser_with_commands(*functions):
+    parser = flam.FlagParser()
+    parser.register_command(flam.help)
+    for function in functions:
+        parser.register_command(function)
+    return parser
+
+
+def test_dispatch_longest_match():
+    called = []
+
+    def user(*args):
+        called.append(('user', args))
+
+    def user_add(name):
+        called.append(('user_add', name))
+
+    parser = _parser_with_commands(user, user_add)
+    assert_equal(parser.dispatch_command(['user', 'add', 'bob']), True)
+    assert_equal(parser.dispatch_command(['user', 'list']), True)
+    assert_equal(called, [('user_add', 'bob'), ('user', ('list',))])
+
+
+def test_dispatch_unknown_command():
+    def user_add(name):
+        pass
+
+    parser = _parser_with_commands(user_add)
+    assert_raises(flam.CommandError, parser.dispatch_command, ['user'])
+    assert_raises(flam.CommandError, parser.dispatch_command, ['moo'])
+
+
+def test_format_commands():
+    def user_add(name, group=None, *extra):
+        """Add a user."""
+
+    def secret():
+        pass
+
+    parser = _parser_with_commands(user_add)
+    parser.hide_command(secret)
+    assert_equal(parser.format_commands(), '\n'.join([
+        'Commands:',
+        'help',
+        '    Display help on available commands.',
+        '',
+        'user add <name> [<group> <extra> ...]',
+        '    Add a user.',
+        '',
+        '',
+    ]))
+
+
+def test_format_commands_updates_on_register():
+    def user_add(name):
+        pass
+
+    parser = _parser_with_commands()
+    assert_true('user add' not in parser.format_commands())
+    parser.register_command(user_add)
+    assert_true('user add <name>' in parser.format_commands())
+
+
+def test_dispatch_argument_counts():
+    called = []
+
+    def copy(source, dest=None):
+        called.append((source, dest))
+
+    parser = _parser_with_commands(copy)
+    parser.dispatch_command(['copy', 'a'])
+    parser.dispatch_command(['copy', 'a', 'b'])
+    assert_equal(called, [('a', None), ('a', 'b')])
+    assert_raises(flam.CommandError, parser.dispatch_command, ['copy'])
+    assert_raises(flam.CommandError, parser.dispatch_command,
+                  ['copy', 'a', 'b', 'c'])
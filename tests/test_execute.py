@@ -0,0 +1,26 @@
+# encoding: utf-8
+#
+# Copyright (C) 2009 Alec Thomas <alec@swapoff.org>
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+# Author: Alec Thomas <alec@swapoff.org>
+
+from nose.tools import assert_equal
+
+import flam
+
+
+def test_execute():
+    assert_equal(flam.execute(['sh', '-c', 'echo out; echo err >&2; exit 3']),
+                 (3, 'out\n', 'err\n'))
+
+
+def test_execute_spooled():
+    returncode, stdout, stderr = flam.execute(['sh', '-c', 'echo out'],
+                                              spool=True)
+    assert_equal(returncode, 0)
+    assert_equal(stdout.read(), 'out\n')
+    assert_equal(stderr.read(), '')
@@ -10,7 +10,7 @@
 
 from __future__ import with_statement
 
-from nose.tools import assert_equal, assert_true
+from nose.tools import assert_equal, assert_raises, assert_true
 
 import optparse
 from tempfile import NamedTemporaryFile
@@ -72,3 +72,89 @@ def test_set_version_adds_flag():
     parser.set_version('0.1')
     assert_true(_parser_options(parser), ['--help', '--flags', '--version'])
     assert_true(parser.version, '0.1')
+
+
+def test_load_flags_last_entry_wins():
+    parser = flam.FlagParser(prog='app')
+    with NamedTemporaryFile() as fd:
+        print >> fd, """
+        verbose = true
+        test = 1
+        quiet = false
+        [other]
+        test = 2
+        [app]
+        test = 3
+        """
+        fd.flush()
+        assert_equal(parser._load_flags(fd.name), ['--verbose', '--test=3'])
+
+
+def test_option_help_sorted():
+    parser = flam.FlagParser()
+    parser.add_option('--zeta', help='last')
+    parser.add_option('--alpha', help='first')
+    assert_equal(_parser_options(parser),
+                 ['--help', '--flags', '--zeta', '--alpha'])
+    help = parser.format_option_help()
+    assert_true(help.index('--alpha') < help.index('--flags')
+                < help.index('--zeta'), help)
+
+
+def test_values_proxy_defaults():
+    parser = flam.FlagParser()
+    parser.add_option('--long-listing', dest='long_listing', default=True)
+    flags = flam.ValuesProxy(parser)
+    assert_equal(flags.long_listing, True)
+    assert_equal(flags.unknown, None)
+    flags.long_listing = False
+    assert_equal(flags.long_listing, False)
+
+
+def test_help_updates_with_options():
+    parser = flam.FlagParser()
+    assert_true('--alpha' not in parser.format_help())
+    parser.add_option('--alpha', help='first', default=1)
+    assert_true('first [1]' in parser.format_help())
+    parser.set_default('alpha', 2)
+    assert_true('first [2]' in parser.format_help())
+
+
+def test_usage_from_docstring():
+    def main(args):
+        """Usage: %prog <thing>"""
+    parser = flam.FlagParser(prog='test')
+    parser.set_usage_from(main)
+    assert_equal(parser.get_usage(), 'Usage: test <thing>\n')
+    parser.set_usage_from(lambda args: None)
+    assert_equal(parser.get_usage(), 'Usage: test <thing>\n')
+    parser.set_usage_from(main)
+    parser.set_usage('%prog <other>')
+    assert_true('Usage: test <other>' in parser.format_help())
+
+
+def test_flag_property():
+    flag_parser, flags = flam.flag_parser, flam.flags
+    flam.flag_parser = flam.FlagParser()
+    flam.flags = flam.ValuesProxy(flam.flag_parser)
+    try:
+        class Config(object):
+            size = flam.Flag('--size', type=int, default=3)
+            name = flam.Flag('--name', required=True)
+
+        config = Config()
+        assert_equal(config.size, 3)
+        assert_raises(optparse.OptionValueError, getattr, config, 'name')
+        flam.parse_args(['--size=4', '--name=bob'])
+        assert_equal((config.size, config.name), (4, 'bob'))
+    finally:
+        flam.flag_parser, flam.flags = flag_parser, flags
+
+
+def test_list_option():
+    parser = flam.FlagParser()
+    parser.add_option('--names', type='list')
+    options, _ = parser.parse_args(['--names=a, b,c'])
+    assert_equal(options.names, ['a', 'b', 'c'])
+    options, _ = parser.parse_args(['--names', ' a '])
+    assert_equal(options.names, ['a'])
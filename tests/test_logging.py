@@ -0,0 +1,107 @@
+# encoding: utf-8
+#
+# Copyright (C) 2009 Alec Thomas <alec@swapoff.org>
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+# Author: Alec Thomas <alec@swapoff.org>
+
+import logging
+
+from nose.tools import assert_equal
+
+import flam
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class _RecordHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def test_background_handler():
+    target = _ListHandler()
+    handler = flam.BackgroundHandler(target)
+    logger = logging.getLogger('flam.test.background')
+    logger.addHandler(handler)
+    try:
+        args = ['a']
+        logger.warning('got %s', args)
+        args.append('b')
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+    assert_equal(target.messages, ["got ['a']"])
+
+
+def test_background_handler_bad_arguments():
+    target = _ListHandler()
+    handler = flam.BackgroundHandler(target)
+    shared = _RecordHandler()
+    logger = logging.getLogger('flam.test.background.bad')
+    logger.addHandler(handler)
+    logger.addHandler(shared)
+    raise_exceptions = logging.raiseExceptions
+    logging.raiseExceptions = False
+    try:
+        logger.warning('%s %s', 1)
+        logger.warning('got %s', 'a')
+    finally:
+        logging.raiseExceptions = raise_exceptions
+        logger.removeHandler(shared)
+        logger.removeHandler(handler)
+        handler.close()
+    assert_equal(target.messages, ['got a'])
+    # Records seen by other handlers are left untouched.
+    assert_equal([(r.msg, r.args) for r in shared.records],
+                 [('%s %s', (1,)), ('got %s', ('a',))])
+
+
+def test_logger_level_follows_set_level():
+    logger = flam.get_logger('flam.test.levels')
+    try:
+        flam.log_manager.set_level(logging.INFO)
+        assert_equal(logger.isEnabledFor(flam.FINE), False)
+        flam.log_manager.set_level(flam.FINEST)
+        assert_equal(logger.isEnabledFor(flam.FINE), True)
+        logger.setLevel(logging.WARNING)
+        assert_equal(logger.isEnabledFor(logging.INFO), False)
+    finally:
+        logger.setLevel(logging.NOTSET)
+        flam.log_manager.set_level(flam.DEFAULT_LOG_LEVEL)
+
+
+def test_logger_level_follows_plain_loggers():
+    logger = flam.get_logger('flam.test.plain.child')
+    root = logging.getLogger()
+    try:
+        flam.log_manager.set_level(logging.INFO)
+        assert_equal(logger.isEnabledFor(flam.FINE), False)
+        root.setLevel(flam.FINEST)
+        assert_equal(logger.isEnabledFor(flam.FINE), True)
+        logging.setLoggerClass(logging.Logger)
+        try:
+            plain = logging.getLogger('flam.test.plain')
+        finally:
+            logging.setLoggerClass(flam.Logger)
+        assert_equal(logger.isEnabledFor(flam.FINE), True)
+        plain.setLevel(logging.INFO)
+        assert_equal(logger.isEnabledFor(flam.FINE), False)
+        plain.setLevel(logging.NOTSET)
+        assert_equal(logger.isEnabledFor(flam.FINE), True)
+    finally:
+        flam.log_manager.set_level(flam.DEFAULT_LOG_LEVEL)
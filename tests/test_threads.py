@@ -0,0 +1,27 @@
+# encoding: utf-8
+#
+# Copyright (C) 2009 Alec Thomas <alec@swapoff.org>
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+# Author: Alec Thomas <alec@swapoff.org>
+
+from nose.tools import assert_equal
+
+import flam
+
+
+def test_thread_pool_runs_queued_jobs_before_quit():
+    results = []
+
+    def add_pair(first, second=None):
+        results.extend([first, second])
+
+    pool = flam.ThreadPool(threads=2)
+    for i in range(10):
+        pool.add(results.append, i)
+    pool.add(add_pair, 10, second=11)
+    pool.quit()
+    assert_equal(sorted(results), range(12))
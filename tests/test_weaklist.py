@@ -0,0 +1,98 @@
+# encoding: utf-8
+#
+# Copyright (C) 2009 Alec Thomas <alec@swapoff.org>
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+# Author: Alec Thomas <alec@swapoff.org>
+
+from nose.tools import assert_equal, assert_raises
+
+import flam
+
+
+class _Value(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+
+def _names(values):
+    return '[%s]' % ', '.join(map(str, values))
+
+
+def test_remove_proxy_from_list():
+    values = [_Value(name) for name in 'abc']
+    things = flam.WeakList(values)
+    things.remove(things[1])
+    assert_equal(repr(things), '[a, c]')
+    for thing in list(things):
+        things.remove(thing)
+    assert_equal(len(things), 0)
+    assert_raises(ValueError, things.remove, values[0])
+
+
+def test_clear_oldest_first():
+    values = [_Value(str(i)) for i in range(100)]
+    things = flam.WeakList(values)
+    while values:
+        del values[0]
+        assert_equal(repr(things), _names(values))
+    assert_equal(len(things), 0)
+
+
+def test_clear_after_inserts():
+    values = [_Value(str(i)) for i in range(4)]
+    things = flam.WeakList(values)
+    # Repeated inserts at one position run out of key precision.
+    for i in range(100):
+        value = _Value('i%d' % i)
+        values.insert(2, value)
+        things.insert(2, value)
+    del value
+    assert_equal(repr(things), _names(values))
+    for i in range(0, len(values), 3)[::-1]:
+        del values[i]
+    assert_equal(repr(things), _names(values))
+    while values:
+        del values[len(values) // 2]
+        assert_equal(repr(things), _names(values))
+
+
+def test_clear_after_list_methods():
+    values = [_Value(name) for name in 'abcdefgh']
+    things = flam.WeakList(values)
+    things.pop(0)
+    del things[0]
+    assert_equal(repr(things), '[c, d, e, f, g, h]')
+    del values[3]
+    assert_equal(repr(things), '[c, e, f, g, h]')
+    things.reverse()
+    del values[5]
+    assert_equal(repr(things), '[h, f, e, c]')
+    del things[1:3]
+    things += [values[0]]
+    things[0] = values[1]
+    assert_equal(repr(things), '[b, c, a]')
+    del values[2]
+    assert_equal(repr(things), '[b, a]')
+
+
+def test_remove_after_list_methods():
+    values = [_Value(name) for name in 'abc']
+    things = flam.WeakList(values + values)
+    things.pop(0)
+    things.remove(values[0])
+    assert_equal(repr(things), '[b, c, b, c]')
+    del things[0]
+    things.reverse()
+    things.remove(values[1])
+    assert_equal(repr(things), '[c, c]')
+    things += [values[0]]
+    things.remove(values[0])
+    assert_equal(repr(things), '[c, c]')
+    assert_raises(ValueError, things.remove, values[1])